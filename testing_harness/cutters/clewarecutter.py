@@ -38,7 +38,9 @@ class ClewareCutter(Cutter):
         _MIN_SLEEP_DURATION (integer):
             Minimum amount of time between retry attempts
         _MAX_SLEEP_DURATION (integer):
-            Maximum amount of time between retry attempts
+            Maximum amount of time between retry attempts. The upper bound of
+            the random delay starts at half of this and doubles on each
+            retry, capped to this.
         _POWER_ON (str):
             The string passed to clewarecontrol to turn the device on
         _POWER_OFF (str):
@@ -47,7 +49,8 @@ class ClewareCutter(Cutter):
     # if two devices try to access same cutter at the same time, it fails
     # sporadically (two instances of clewarecontrol seem to interfere with
     # each other). If this happens, retry with random delay so that devices
-    # hopefully don't collide again
+    # hopefully don't collide again. The delay range starts wide enough to
+    # separate colliding devices and grows on each further retry.
     _RETRIES = 3
     _MIN_SLEEP_DURATION = 1
     _MAX_SLEEP_DURATION = 10
@@ -101,26 +104,32 @@ class ClewareCutter(Cutter):
             subprocess32.CalledProcessError or subprocess32.TimeoutExpired
             on failure
         """
+        command = [
+            "clewarecontrol",
+            "-d",
+            str(self._cutter_id),
+            "-c",
+            "1",
+            "-as",
+            str(self._channel),
+            str(power_status)
+        ]
+
         error = ""
-        for _ in range(self._RETRIES):
+        for attempt in range(self._RETRIES):
             try:
-                misc.local_execute(
-                    [
-                        "clewarecontrol",
-                        "-d",
-                        str(self._cutter_id),
-                        "-c",
-                        "1",
-                        "-as",
-                        str(self._channel),
-                        str(power_status)
-                    ])
+                misc.local_execute(command)
             except (subprocess32.CalledProcessError,
                     subprocess32.TimeoutExpired) as err:
                 error = err
-                sleep(
-                    random.randint(
-                        self._MIN_SLEEP_DURATION, self._MAX_SLEEP_DURATION))
+                # No point in waiting after the last attempt
+                if attempt + 1 < self._RETRIES:
+                    max_sleep_duration = min(
+                        self._MAX_SLEEP_DURATION / 2.0 * 2 ** attempt,
+                        self._MAX_SLEEP_DURATION)
+                    sleep(
+                        random.uniform(
+                            self._MIN_SLEEP_DURATION, max_sleep_duration))
             else:
                 return
 
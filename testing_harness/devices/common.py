@@ -20,6 +20,8 @@ the Device base class.
 """
 
 import os
+import re
+import errno
 import time
 import sys
 try:
@@ -30,6 +32,16 @@ except ImportError:
 from aft.logger import Logger as logger
 import aft.tools.ssh as ssh
 
+# leases_file_path -> (file fingerprint, parsed leases)
+_LEASE_CACHE = {}
+
+# dnsmasq.leases contains rows with the following format:
+# <lease_expiry_time_as_epoch_format> <mac> <ip> <hostname> <domain>
+# See:
+#http://lists.thekelleys.org.uk/pipermail/dnsmasq-discuss/2005q1/000143.html
+_LEASE_PATTERN = re.compile(
+    r"^\S+[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)", re.MULTILINE)
+
 def wait_for_responsive_ip_for_pc_device(
     leases_file_path,
     timeout,
@@ -47,22 +59,31 @@ def wait_for_responsive_ip_for_pc_device(
         Ip address as a string, or None if ip address was not responsive.
     """
     logger.info("Waiting for the device to become responsive")
-    logger.debug("Timeout: " + str(timeout))
-    logger.debug("Polling interval: " + str(polling_interval))
+    logger.debug("Timeout: %s", timeout)
+    logger.debug("Polling interval: %s", polling_interval)
 
-    for _ in range(timeout // polling_interval):
+    next_poll = time.time()
+    deadline = next_poll + timeout
+    while True:
         responsive_ip = get_ip_for_pc_device(leases_file_path)
 
-        if not responsive_ip:
-            time.sleep(polling_interval)
-            continue
+        if responsive_ip:
+            logger.info("Got a response from %s", responsive_ip)
+            return responsive_ip
 
-        logger.info("Got a response from " + responsive_ip)
-        return responsive_ip
+        now = time.time()
+        if now >= deadline:
+            break
+
+        # Keep the polls on a fixed schedule, so that the time spent probing
+        # is not added on top of the polling interval. The last poll is done
+        # at the deadline instead of sleeping past it.
+        next_poll = max(next_poll + polling_interval, now)
+        time.sleep(min(next_poll, deadline) - now)
 
     logger.info("No responsive ip was found")
 
-def get_ip_for_pc_device(leases_file_path):
+def get_ip_for_pc_device(leases_file_path, unresponsive_ip=None):
     """
     Return active ip address for PC like device that leases it through dnsmasq.
 
@@ -71,6 +92,8 @@ def get_ip_for_pc_device(leases_file_path):
 
     Args:
         leases_file_path (str): Path to dnsmasq leases file
+        unresponsive_ip (str): Address that was just found unresponsive and
+            is not probed again
 
     Returns:
         Device ip address as string or None if device does not have active
@@ -79,6 +102,8 @@ def get_ip_for_pc_device(leases_file_path):
     ip_addresses = get_leased_ip_addresses_for_mac(leases_file_path)
 
     for ip_address in ip_addresses:
+        if ip_address == unresponsive_ip:
+            continue
         if ssh.test_ssh_connectivity(ip_address):
             return ip_address
 
@@ -122,24 +147,31 @@ def get_mac_leases_from_dnsmasq(leases_file_path):
             "hostname": "device_host_name",
             "client_id": "client_id_or_*_if_unset"
         }
+
+        The list is cached until the leases file changes, so it must not be
+        modified by the caller.
     """
+    # The file is polled while waiting for the device to boot, but it only
+    # changes when dnsmasq hands out a lease.
+    stat = os.stat(leases_file_path)
+    fingerprint = (stat.st_ino, stat.st_mtime, stat.st_size)
+    cached = _LEASE_CACHE.get(leases_file_path)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
     with open(leases_file_path) as lease_file:
-        leases = lease_file.readlines()
-
-    leases_list = []
-    # dnsmasq.leases contains rows with the following format:
-    # <lease_expiry_time_as_epoch_format> <mac> <ip> <hostname> <domain>
-    # See:
-    #http://lists.thekelleys.org.uk/pipermail/dnsmasq-discuss/2005q1/000143.html
-
-    for lease in leases:
-        lease = lease.split()
-        leases_list.append({
-            "mac": lease[1],
-            "ip": lease[2],
-            "hostname": lease[3],
-            "client_id": lease[4],
-        })
+        leases = lease_file.read()
+
+    leases_list = [
+        {
+            "mac": lease.group(1),
+            "ip": lease.group(2),
+            "hostname": lease.group(3),
+            "client_id": lease.group(4),
+        }
+        for lease in _LEASE_PATTERN.finditer(leases)]
+
+    _LEASE_CACHE[leases_file_path] = (fingerprint, leases_list)
     return leases_list
 
 def log_subprocess32_error_and_abort(err):
@@ -149,8 +181,8 @@ def log_subprocess32_error_and_abort(err):
     Args:
         err (subprocess32.CalledProcessError): The exception
     """
-    logger.critical(str(err.cmd) + " failed with error code: " +
-                     str(err.returncode) + " and output: " + str(err.output))
+    logger.critical("%s failed with error code: %s and output: %s",
+                    err.cmd, err.returncode, err.output)
     logger.critical("Aborting")
     sys.exit(1)
 
@@ -163,8 +195,8 @@ def make_directory(directory):
     """
     try:
         os.makedirs(directory)
-    except OSError:
-        if not os.path.isdir(directory):
+    except OSError as err:
+        if err.errno != errno.EEXIST:
             raise
 
 def verify_device_mode(ip, mode_name):
@@ -185,17 +217,16 @@ def verify_device_mode(ip, mode_name):
     try:
         sshout = ssh.remote_execute(ip, ["cat", "/proc/version"])
         if mode_name in sshout:
-            logger.info("Found " + mode_name + " in DUT /proc/version")
+            logger.info("Found %s in DUT /proc/version", mode_name)
             return True
-        logger.info("Didn't find " + mode_name + " in DUT /proc/version")
-        logger.debug("/cat/proc/version: " + str(sshout))
+        logger.info("Didn't find %s in DUT /proc/version", mode_name)
+        logger.debug("/cat/proc/version: %s", sshout)
         return False
 
     except subprocess32.CalledProcessError as err:
         logger.warning(
-            "Failed verifying the device mode with command: '" +
-            str(err.cmd) + "' failed with error code: '" +
-            str(err.returncode) + "' and output: '" +
-            str(err.output) + "'.")
+            "Failed verifying the device mode with command: '%s' failed "
+            "with error code: '%s' and output: '%s'.",
+            err.cmd, err.returncode, err.output)
 
         return False
@@ -79,10 +79,15 @@ class Device(with_metaclass(abc.ABCMeta, object)):
                                                self.name + " doesn't include " +
                                                "serial_port and/or serial_bauds.")
 
+        # Legacy serial adapters may need software flow control
+        xonxoff = self.parameters.get("serial_xonxoff", "false").lower() in \
+            ("1", "yes", "true", "on")
+
         recorder = threading.Thread(target=serialrecorder.main,
                                 args=(self.parameters["serial_port"],
                                 self.parameters["serial_bauds"],
-                                self.parameters["serial_log_name"]),
+                                self.parameters["serial_log_name"],
+                                xonxoff),
                                 name=(str(os.getpid()) + "recorder"))
 
         recorder.start()
@@ -21,6 +21,10 @@ Class representing a PC-like Device with an IP.
 import os
 import sys
 import json
+try:
+    import subprocess32
+except ImportError:
+    import subprocess as subprocess32
 
 from aft.logger import Logger as logger
 import aft.config as config
@@ -29,6 +33,9 @@ import aft.errors as errors
 import aft.tools.ssh as ssh
 import aft.devices.common as common
 
+# layout_file_name -> (file fingerprint, root partition path)
+_ROOT_PARTITION_CACHE = {}
+
 class PCDevice(Device):
     """
     Class representing a PC-like device.
@@ -43,6 +50,9 @@ class PCDevice(Device):
             The polling interval used when waiting for responsive ip address
         _SSH_IMAGE_WRITING_TIMEOUT (integer):
             The timeout for flashing the image.
+        _SSH_SETTLING_TIMEOUT (integer):
+            The timeout for re-reading the partition table and letting udev
+            settle after flashing.
         _IMG_NFS_MOUNT_POINT (str):
             The location where the service OS mounts the nfs filesystem so that
             it can access the image file etc.
@@ -51,14 +61,24 @@ class PCDevice(Device):
             for SSH key injection.
         _SUPER_ROOT_MOUNT_POINT (str):
             Mount location used when having to mount two layers
+        _PASSWD_FILE (str):
+            The passwd file of the mounted image root filesystem
+        _DROPBEAR_AUTHORIZED_KEYS (str):
+            The dropbear authorized_keys file of the mounted image root
+            filesystem
     """
     _RETRY_ATTEMPTS = 4
     _BOOT_TIMEOUT = 240
-    _POLLING_INTERVAL = 10
+    _POLLING_INTERVAL = 3
     _SSH_IMAGE_WRITING_TIMEOUT = 1440
+    _SSH_SETTLING_TIMEOUT = 5 * 60
     _IMG_NFS_MOUNT_POINT = "/mnt/img_data_nfs"
     _ROOT_PARTITION_MOUNT_POINT = "/mnt/target_root/"
     _SUPER_ROOT_MOUNT_POINT = "/mnt/super_target_root/"
+    _PASSWD_FILE = os.path.join(_ROOT_PARTITION_MOUNT_POINT, "etc/passwd")
+    _DROPBEAR_AUTHORIZED_KEYS = os.path.join(
+        _ROOT_PARTITION_MOUNT_POINT,
+        "var/lib/dropbear/authorized_keys")
 
     def __init__(self, parameters, channel, kb_emulator):
         """
@@ -126,11 +146,65 @@ class PCDevice(Device):
         """
         Returns device ip address
 
+        The last known responsive address is tried first, so that the leases
+        file does not need to be consulted while the device keeps its address.
+
         Returns:
             (str): The device ip address
         """
-        return common.get_ip_for_pc_device(
-            self.parameters["leases_file_name"])
+        if self.dev_ip and ssh.test_ssh_connectivity(self.dev_ip):
+            return self.dev_ip
+
+        # Don't probe the last known address twice if it is still the leased one
+        ip_address = common.get_ip_for_pc_device(
+            self.parameters["leases_file_name"],
+            unresponsive_ip=self.dev_ip)
+        if ip_address:
+            self.dev_ip = ip_address
+
+        return ip_address
+
+    def _get_known_ip(self):
+        """
+        Returns the device ip address without testing it, if it is known
+
+        The address only changes when the device is rebooted, so it is not
+        tested over ssh before every command. _power_cycle forgets it, and a
+        reboot by other means is caught by _get_changed_ip once a command to
+        the old address fails.
+
+        Returns:
+            (str): The device ip address
+        """
+        if self.dev_ip:
+            return self.dev_ip
+        return self.get_ip()
+
+    def _get_changed_ip(self):
+        """
+        Look the device ip address up again after an ssh command to it failed,
+        as the device may have been rebooted, for example by a test case, and
+        leased a new address.
+
+        get_ip tests the last known address first, so a command that failed
+        on a still responsive device is not mistaken for an address change.
+
+        Returns:
+            (str or None):
+                The new device ip address, or None if the address has not
+                changed or the device is not responsive
+        """
+        old_ip = self.dev_ip
+        ip_address = self.get_ip()
+        if not ip_address or ip_address == old_ip:
+            return None
+
+        logger.info("Device ip address changed from %s to %s",
+                    old_ip, ip_address)
+        if old_ip:
+            ssh.close_master_connection(old_ip)
+        ssh.open_master_connection(ip_address)
+        return ip_address
 
     def boot_internal_test_mode(self):
         self._enter_mode("test_mode", self._boot_internal_keystrokes)
@@ -156,16 +230,16 @@ class PCDevice(Device):
             " for pcdevice.py: _enter_mode function")
 
         # Sometimes booting to a mode fails.
-        logger.info("Trying to enter " + target + " up to " +
-                    str(self._RETRY_ATTEMPTS) + " times.")
+        logger.info("Trying to enter %s up to %s times.",
+                    target, self._RETRY_ATTEMPTS)
 
         for _ in range(self._RETRY_ATTEMPTS):
             try:
                 self._power_cycle()
 
                 if self.kb_emulator:
-                    logger.info("Using " + type(self.kb_emulator).__name__ +
-                                " to send keyboard sequence " + keystrokes)
+                    logger.info("Using %s to send keyboard sequence %s",
+                                type(self.kb_emulator).__name__, keystrokes)
 
                     self.kb_emulator.send_keystrokes(keystrokes)
 
@@ -184,17 +258,16 @@ class PCDevice(Device):
                         logger.info("Correctly booted support image")
                         return
                 else:
-                    logger.warning("Failed entering " + target + ".")
+                    logger.warning("Failed entering %s.", target)
 
             except KeyboardInterrupt:
                 raise
 
             except:
                 _err = sys.exc_info()
-                logger.error(str(_err[0]).split("'")[1] + ": " + str(_err[1]))
+                logger.error("%s: %s", str(_err[0]).split("'")[1], _err[1])
 
-        logger.critical(
-            "Unable to get the device in mode " + target)
+        logger.critical("Unable to get the device in mode %s", target)
 
         raise errors.AFTDeviceError(
             "Could not set the device in mode " + target)
@@ -213,8 +286,24 @@ class PCDevice(Device):
             self._BOOT_TIMEOUT,
             self._POLLING_INTERVAL)
 
+        # Multiplex the following ssh commands over a single connection
+        if self.dev_ip:
+            ssh.open_master_connection(self.dev_ip)
+
         return self.dev_ip
 
+    def _power_cycle(self):
+        """
+        Close the ssh master connection to the device, forget its ip address
+        and reboot it.
+        """
+        if self.dev_ip:
+            ssh.close_master_connection(self.dev_ip)
+            # The device may lease a different address after the reboot
+            self.dev_ip = None
+
+        super(PCDevice, self)._power_cycle()
+
     def _verify_mode(self, mode):
         """
         Check if the device with given ip is responsive to ssh
@@ -243,15 +332,14 @@ class PCDevice(Device):
         ssh.remote_execute(self.dev_ip, ["mount", self._IMG_NFS_MOUNT_POINT],
                            ignore_return_codes=[32])
 
-        logger.info("Writing " + str(nfs_file_name) + " to internal storage.")
+        logger.info("Writing %s to internal storage.", nfs_file_name)
 
         bmap_args = ["bmaptool", "copy", nfs_file_name, self._target_device]
         if os.path.isfile(filename + ".bmap"):
-            logger.info("Found "+ filename +".bmap. Using bmap for flashing.")
+            logger.info("Found %s.bmap. Using bmap for flashing.", filename)
 
         else:
-            logger.info("Didn't find " + filename +
-                         ".bmap. Flashing without it.")
+            logger.info("Didn't find %s.bmap. Flashing without it.", filename)
             bmap_args.insert(2, "--nobmap")
 
         ssh.remote_execute(self.dev_ip, bmap_args,
@@ -260,12 +348,19 @@ class PCDevice(Device):
         # Flashing the same file as already on the disk causes non-blocking
         # removal and re-creation of /dev/disk/by-partuuid/ files. This sequence
         # either delays enough or actually settles it.
+        # The steps are chained into a single remote shell command to save
+        # round-trips.
         logger.info("Partprobing.")
-        ssh.remote_execute(self.dev_ip, ["partprobe", self._target_device])
-        ssh.remote_execute(self.dev_ip, ["sync"])
-        ssh.remote_execute(self.dev_ip, ["udevadm", "trigger"])
-        ssh.remote_execute(self.dev_ip, ["udevadm", "settle"])
-        ssh.remote_execute(self.dev_ip, ["udevadm", "control", "-S"])
+        ssh.remote_execute(
+            self.dev_ip,
+            [
+                "partprobe", self._target_device,
+                "&&", "sync",
+                "&&", "udevadm", "trigger",
+                "&&", "udevadm", "settle",
+                "&&", "udevadm", "control", "-S"
+            ],
+            timeout=self._SSH_SETTLING_TIMEOUT)
 
     def _mount_single_layer(self, image_file_name):
         """
@@ -295,22 +390,34 @@ class PCDevice(Device):
         layout_file_name = self.get_layout_file_name(image_file_name)
 
         if not os.path.isfile(layout_file_name):
-            logger.info("Disk layout file " + layout_file_name  +
-                         " doesn't exist. Finding root partition.")
+            logger.info("Disk layout file %s doesn't exist. Finding root "
+                        "partition.", layout_file_name)
             return self.find_root_partition()
 
-        layout_file = open(layout_file_name, "r")
-        disk_layout = json.load(layout_file)
+        # The layout file of an image does not change between flashes, so it
+        # is parsed again only if it has been replaced
+        stat = os.stat(layout_file_name)
+        fingerprint = (stat.st_ino, stat.st_mtime, stat.st_size)
+        cached = _ROOT_PARTITION_CACHE.get(layout_file_name)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        with open(layout_file_name, "r") as layout_file:
+            disk_layout = json.load(layout_file)
         rootfs_partition = next(
-            partition for partition in list(disk_layout.values()) \
+            partition for partition in disk_layout.values() \
             if isinstance(partition, dict) and \
             partition["name"] == "rootfs")
-        return os.path.join(
+        root_partition_path = os.path.join(
             "/dev",
             "disk",
             "by-partuuid",
             rootfs_partition["uuid"])
 
+        _ROOT_PARTITION_CACHE[layout_file_name] = (fingerprint,
+                                                   root_partition_path)
+        return root_partition_path
+
     def get_layout_file_name(self, image_file_name):
         return image_file_name.split(".")[0] + "-disk-layout.json"
 
@@ -380,92 +487,52 @@ class PCDevice(Device):
         else:
             self._mount_two_layers()
 
-        # Identify the home of the root user
-        root_user_home = ssh.remote_execute(
-            self.dev_ip,
-            [
-                "cat",
-                os.path.join(
-                    self._ROOT_PARTITION_MOUNT_POINT,
-                    "etc/passwd"),
-                "|",
-                "grep",
-                "-e",
-                '"^root"',
-                "|",
-                "sed",
-                "-e",
-                '"s/root:.*:root://"',
-                "|",
-                "sed", "-e",
-                '"s/:.*//"']).rstrip().lstrip("/")
-
-        # Ignore return value: directory might exist
+        # Identify the home of the root user and create its .ssh directory.
+        # The steps are chained into a single remote shell command to save
+        # round-trips, and the command prints the home for the steps below.
+        ssh_directory = self._ROOT_PARTITION_MOUNT_POINT + "$home/.ssh"
         logger.info("Writing ssh-key to device.")
-        ssh.remote_execute(
-            self.dev_ip,
-            [
-                "mkdir",
-                os.path.join(
-                    self._ROOT_PARTITION_MOUNT_POINT,
-                    root_user_home,
-                    ".ssh")
-            ],
-            ignore_return_codes=[1])
-
-        ssh.remote_execute(
+        root_user_home = ssh.remote_execute(
             self.dev_ip,
             [
-                "chmod",
-                "700",
-                os.path.join(
-                    self._ROOT_PARTITION_MOUNT_POINT,
-                    root_user_home,
-                    ".ssh")
-            ])
+                "home=$(awk", "-F:", "'$1 == \"root\" {print $6; exit}'",
+                self._PASSWD_FILE + ")",
+                "&&", "mkdir", "-p", ssh_directory,
+                "&&", "chmod", "700", ssh_directory,
+                "&&", "echo", "$home"
+            ]).rstrip().lstrip("/")
+
+        authorized_keys = os.path.join(
+            self._ROOT_PARTITION_MOUNT_POINT,
+            root_user_home,
+            ".ssh/authorized_keys")
 
         # Try to copy SSH keys to the authorized_keys file
-
         try:
             ssh.remote_execute(
                 self.dev_ip,
                 [
-                    "cat",
-                    "~/.ssh/authorized_keys",
-                    ">>",
-                    os.path.join(
-                        self._ROOT_PARTITION_MOUNT_POINT,
-                        root_user_home,
-                        ".ssh/authorized_keys")])
-            ssh.remote_execute(
-                self.dev_ip,
-                [
-                    "chmod",
-                    "600",
-                    os.path.join(
-                        self._ROOT_PARTITION_MOUNT_POINT,
-                        root_user_home,
-                        ".ssh/authorized_keys")
+                    "cat", "~/.ssh/authorized_keys", ">>", authorized_keys,
+                    "&&", "chmod", "600", authorized_keys
                 ])
 
         # If the preceding method fails, try to copy them directly to a dropbear authorized_keys files (as the the preceding method fails if the device is running
         # dropbear instead of OpenSSH)
-        except:
-            logger.info("Failed, trying to write the ssh-key in dropbear file instead.")
+        except subprocess32.CalledProcessError as err:
+            logger.warning("Writing the ssh-key failed: %s", err)
+            logger.info("Trying to write the ssh-key in dropbear file instead.")
             ssh.remote_execute(
                 self.dev_ip,
                 [
                     "cat",
                     "~/.ssh/authorized_keys",
                     ">>",
-                    os.path.join(
-                        self._ROOT_PARTITION_MOUNT_POINT,
-                        "var/lib/dropbear/authorized_keys")])
+                    self._DROPBEAR_AUTHORIZED_KEYS])
             logger.info("Success.")
 
 
-        logger.info("Flushing.")
-        ssh.remote_execute(self.dev_ip, ["sync"])
+        # No separate sync: umount flushes the unmounted filesystem, whereas
+        # sync would flush every filesystem mounted on the service OS
         logger.info("Unmounting.")
         ssh.remote_execute(
             self.dev_ip, ["umount", self._ROOT_PARTITION_MOUNT_POINT])
@@ -486,8 +553,23 @@ class PCDevice(Device):
         Return:
             Return value of aft.ssh.remote_execute
         """
+        try:
+            return ssh.remote_execute(
+                self._get_known_ip(),
+                command,
+                timeout=timeout,
+                user=user)
+        except subprocess32.CalledProcessError as err:
+            # ssh exits with 255 if the connection fails. Retry once if the
+            # device turns out to have a new address.
+            if err.returncode != 255:
+                raise err
+            ip_address = self._get_changed_ip()
+            if not ip_address:
+                raise err
+
         return ssh.remote_execute(
-            self.get_ip(),
+            ip_address,
             command,
             timeout=timeout,
             user=user)
@@ -501,5 +583,17 @@ class PCDevice(Device):
             destination (str): The destination file
             user (str): The user who executes the command
         """
-        ssh.push(self.get_ip(), source=source,
+        try:
+            ssh.push(self._get_known_ip(), source=source,
+                     destination=destination, user=user)
+            return
+        except subprocess32.CalledProcessError as err:
+            # scp does not tell connection failures apart from other errors,
+            # but copying again is harmless. Retry once if the device turns
+            # out to have a new address.
+            ip_address = self._get_changed_ip()
+            if not ip_address:
+                raise err
+
+        ssh.push(ip_address, source=source,
                  destination=destination, user=user)
@@ -17,6 +17,31 @@ from aft.kb_emulators.kb_emulator import KeyboardEmulator
 import aft.errors as errors
 from aft.logger import Logger as logger
 
+def _run_pem(interface, port, keystrokes, exceptions):
+    """
+    Play back a PEM keystroke file. Intended to be run in a separate process,
+    so any exception raised by PEM is put to 'exceptions' instead.
+
+    Args:
+        interface (str): PEM interface
+        port (str): PEM port
+        keystrokes (str): PEM keystroke file
+        exceptions (multiprocessing.Queue): Queue to put the exception raised
+            by PEM to
+    """
+    from pem.main import main as pem_main
+
+    try:
+        pem_main(
+        [
+            "pem",
+            "--interface", interface,
+            "--port", port,
+            "--playback", keystrokes
+        ])
+    except Exception as err:
+        exceptions.put(err)
+
 class ArduinoKeyboard(KeyboardEmulator):
     """
     Class for Arduino keyboard emulator
@@ -42,22 +67,12 @@ class ArduinoKeyboard(KeyboardEmulator):
         Raises:
             aft.errors.AFTDeviceError if PEM connection times out
         """
-        from pem.main import main as pem_main
-
-        def call_pem(exceptions):
-            try:
-                pem_main(
-                [
-                    "pem",
-                    "--interface", self.interface,
-                    "--port", self.emulator_path,
-                    "--playback", _file
-                ])
-            except Exception as err:
-                exceptions.put(err)
-
+        # PEM is run in a separate process so that a hung playback can be
+        # terminated, which also frees the serial port for the next attempt
         exception_queue = Queue()
-        process = Process(target=call_pem, args=(exception_queue,))
+        process = Process(
+            target=_run_pem,
+            args=(self.interface, self.emulator_path, _file, exception_queue))
         # ensure python process is closed in case main process dies but
         # the subprocess is still waiting for timeout
         process.daemon = True
@@ -11,9 +11,10 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 # See the GNU General Public License for more details.
 
-from time import sleep
+from time import sleep, time
 import os.path
-from multiprocessing import Process
+import errno
+import select
 
 from aft.logger import Logger as logger
 from aft.kb_emulators.kb_emulator import KeyboardEmulator
@@ -282,20 +283,9 @@ class GadgetKeyboard(KeyboardEmulator):
             key: A key to send, for example: "a", "z", "3", "F2", "ENTER"
             timeout: how long sending a key will be tried until quitting [s]
         '''
-        def writer(path, message, empty):
-            while True:
-                try:
-                    with open(path, "w") as emulator:
-                        emulator.write(message.decode()) # Send the key
-                        emulator.write(empty) # Stop the key being pressed
-                except IOError:
-                    sleep(1)
-                else:
-                    return 0
-
         # Empty message which will be sent to stop any keys being pressed
-        empty = "\x00\x00\x00\x00\x00\x00\x00\x00"
-        usb_message = bytearray(empty.encode()) # Initialize usb message
+        empty = b"\x00\x00\x00\x00\x00\x00\x00\x00"
+        usb_message = bytearray(empty) # Initialize usb message
         hex_key, _modifier = self.key_to_hex(key) # Translate key to hex code
 
         # Override self.modifier if the key needs a specific one
@@ -307,21 +297,58 @@ class GadgetKeyboard(KeyboardEmulator):
         usb_message[2] = hex_key
         usb_message[0] = modifier
 
-        # Do the writing in a subprocess as it hangs in some rare cases
-        writer = Process(target=writer, args=(self.emulator, usb_message, empty))
-        writer.start()
-        writer.join(20)
-        if writer.is_alive():
-            writer.terminate()
-            msg = "Keyboard emulator couldn't connect to host or it froze"
-            logger.error(msg, "kb_emulator.log")
-            raise TimeoutError(msg)
-
-        logger.info("Sent key: " + key.ljust(5) + "  hex code: " +
-                    format(hex_key, '#04x') + "  modifier: " +
-                    format(modifier, '#04x'), "kb_emulator.log")
+        # Send the key and stop the key being pressed
+        self.write_reports([bytes(usb_message), empty], timeout)
+
+        logger.info("Sent key: %-5s  hex code: %#04x  modifier: %#04x",
+                    key, hex_key, modifier, filename="kb_emulator.log")
         return 0
 
+    def write_reports(self, reports, timeout):
+        '''
+        Write HID keyboard messages to the emulated HID usb port.
+
+        Writing hangs while the host isn't reading the port, so the port is
+        opened in non-blocking mode and waited on with select. If the port
+        can't be opened or written, for example because it hasn't appeared
+        yet, it is reopened after a second.
+
+        Args:
+            reports: List of 8 byte messages to write in order
+            timeout: how long writing will be tried until quitting [s]
+
+        Raises:
+            TimeoutError if all the messages couldn't be written in time
+        '''
+        deadline = time() + timeout
+        reports = list(reports)
+        emulator = None
+        try:
+            while reports:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    msg = "Keyboard emulator couldn't connect to host or it froze"
+                    logger.error(msg, filename="kb_emulator.log")
+                    raise TimeoutError(msg)
+
+                try:
+                    if emulator is None:
+                        emulator = os.open(self.emulator,
+                                           os.O_WRONLY | os.O_NONBLOCK)
+                    if select.select([], [emulator], [], remaining)[1]:
+                        os.write(emulator, reports[0])
+                        reports.pop(0)
+                except (IOError, OSError) as err:
+                    if err.errno == errno.EAGAIN:
+                        continue
+                    if emulator is not None:
+                        os.close(emulator)
+                        emulator = None
+                    sleep(min(1, remaining))
+        finally:
+            if emulator is not None:
+                os.close(emulator)
+
     def key_to_hex(self, key):
         """
         Returns the given keys (US) HID keyboard hex code and possible modifier
@@ -87,28 +87,51 @@ class Logger(object):
     Methods for logging to log files. On default methods log to aft.log file.
 
     Args:
-        log_message: String to log
+        log_message: String to log, may contain %-style placeholders
+        args: Values for the placeholders. Like with the logging module, the
+              message is only formatted if it is going to be logged.
         filename: String for filename/logger suffix, default is aft.log
+                  (keyword argument)
     '''
     @staticmethod
-    def info(log_message, filename="aft.log"):
-        Logger.get_logger(filename).info(log_message)
+    def info(log_message, *args, **kwargs):
+        Logger.get_logger(Logger._pop_filename(kwargs)).info(
+            log_message, *args)
 
     @staticmethod
-    def debug(log_message, filename="aft.log"):
-        Logger.get_logger(filename).debug(log_message)
+    def debug(log_message, *args, **kwargs):
+        Logger.get_logger(Logger._pop_filename(kwargs)).debug(
+            log_message, *args)
 
     @staticmethod
-    def warning(log_message, filename="aft.log"):
-        Logger.get_logger(filename).warning(log_message)
+    def warning(log_message, *args, **kwargs):
+        Logger.get_logger(Logger._pop_filename(kwargs)).warning(
+            log_message, *args)
 
     @staticmethod
-    def critical(log_message, filename="aft.log"):
-        Logger.get_logger(filename).critical(log_message)
+    def critical(log_message, *args, **kwargs):
+        Logger.get_logger(Logger._pop_filename(kwargs)).critical(
+            log_message, *args)
 
     @staticmethod
-    def error(log_message, filename="aft.log"):
-        Logger.get_logger(filename).error(log_message)
+    def error(log_message, *args, **kwargs):
+        Logger.get_logger(Logger._pop_filename(kwargs)).error(
+            log_message, *args)
+
+    @staticmethod
+    def _pop_filename(kwargs):
+        '''
+        Returns the filename keyword argument of the logging methods, or
+        aft.log if it wasn't given.
+
+        Raises:
+            TypeError if any other keyword argument was given
+        '''
+        filename = kwargs.pop("filename", "aft.log")
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments: " +
+                            ", ".join(sorted(kwargs)))
+        return filename
 
 
     @staticmethod
@@ -32,10 +32,9 @@ CONFIG_FILES =  [filename for filename in CONFIG_FILES if CONFIG_FILTER(filename
 
 #Depending on python version, dependencies will differ
 if sys.version_info[0] == 2:
-    dependencies = ["netifaces", "subprocess32", "unittest-xml-reporting",
-                    "pyserial>=3"]
+    dependencies = ["subprocess32", "unittest-xml-reporting", "pyserial>=3"]
 elif sys.version_info[0] == 3:
-    dependencies = ["netifaces", "unittest-xml-reporting", "pyserial>=3"]
+    dependencies = ["unittest-xml-reporting", "pyserial>=3"]
 
 setup(
     name = "aft",
@@ -29,12 +29,15 @@ def vidpid_filter(device):
     Filter function which tests if a 'device' is a USB-powercutter
     """
     try:
-        device_info = subprocess32.check_output(["udevadm", "info", device])
-        device_lines = device_info.split("\n")
-        vid_line = [line for line in device_lines if "ID_VENDOR_ID" in line][0]
-        pid_line = [line for line in device_lines if "ID_MODEL_ID" in line][0]
-        device_vid = vid_line.split("=")[-1]
-        device_pid = pid_line.split("=")[-1]
+        # Only the udev properties (KEY=value lines) are needed
+        device_info = subprocess32.check_output(
+            ["udevadm", "info", "--query=property", device],
+            stderr=subprocess32.DEVNULL,
+            universal_newlines=True)
+        properties = dict(line.split("=", 1)
+                          for line in device_info.splitlines() if "=" in line)
+        device_vid = properties.get("ID_VENDOR_ID")
+        device_pid = properties.get("ID_MODEL_ID")
 
         if (device_vid, device_pid) in ACCEPTED_DEVICES:
             return True
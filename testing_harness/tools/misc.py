@@ -19,36 +19,42 @@ try:
     import subprocess32
 except ImportError:
     import subprocess as subprocess32
-import time
 import os
 
-def local_execute(command, timeout = 60, ignore_return_codes = None):
+def local_execute(command, timeout = 60, ignore_return_codes = None,
+                  discard_output = False):
     """
     Execute a command on local machine. Returns combined stdout and stderr if
     return code is 0 or included in the list 'ignore_return_codes'. Otherwise
     raises a subprocess32 error.
+
+    If 'discard_output' is set, stdout and stderr are routed to /dev/null
+    instead of being buffered and an empty string is returned.
     """
-    process = subprocess32.Popen(command, universal_newlines=True,
-                                 stdout = subprocess32.PIPE,
-                                 stderr = subprocess32.STDOUT)
+    if discard_output:
+        stdout = subprocess32.DEVNULL
+        stderr = subprocess32.DEVNULL
+    else:
+        stdout = subprocess32.PIPE
+        stderr = subprocess32.STDOUT
 
-    # Loop until process returns or timeout expires.
-    start = time.time()
-    output = ""
-    return_code = None
-    while time.time() < start + timeout and return_code == None:
-        return_code = process.poll()
-        if return_code == None:
-            try:
-                output += process.communicate(timeout = 1)[0]
-            except subprocess32.TimeoutExpired:
-                pass
+    process = subprocess32.Popen(command, universal_newlines=True,
+                                 stdout = stdout,
+                                 stderr = stderr)
 
-    if return_code == None:
-        # Time ran out but the process didn't end.
-        raise subprocess32.TimeoutExpired(cmd = command, output = output,
+    # Block until the process returns or the timeout expires
+    try:
+        output = process.communicate(timeout = timeout)[0] or ""
+    except subprocess32.TimeoutExpired:
+        # Time ran out but the process didn't end. Don't wait for the output
+        # pipe to close, as orphaned children of the process may keep it open.
+        process.kill()
+        process.wait()
+        raise subprocess32.TimeoutExpired(cmd = command, output = "",
                                           timeout = timeout)
 
+    return_code = process.returncode
+
     if ignore_return_codes == None:
         ignore_return_codes = []
     if return_code in ignore_return_codes or return_code == 0:
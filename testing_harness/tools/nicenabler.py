@@ -20,9 +20,28 @@ try:
 except ImportError:
     import subprocess as subprocess32
 import os
-import netifaces
 import time
 import argparse
+import select
+import socket
+import errno
+
+_NIC_FILESYSTEM_LOCATION = "/sys/class/net"
+
+# assumes the script is present in the same directory
+_INTERFACE_SCRIPT = os.path.join(os.path.dirname(__file__), "interface_script.sh")
+
+# Netlink protocol and multicast group for network interface notifications
+_NETLINK_ROUTE = 0
+_RTMGRP_LINK = 1
+
+# Polling interval in seconds used if netlink is not available
+_POLLING_INTERVAL = 1
+# Interval in seconds for rescanning interfaces even if no notifications arrive
+_RESCAN_INTERVAL = 30
+
+# interface name -> (inode of its sysfs entry, USB-path of the interface)
+_USB_PATH_CACHE = {}
 
 def _get_nth_parent_dir(path, parent):
     """
@@ -30,38 +49,120 @@ def _get_nth_parent_dir(path, parent):
     """
     if parent == 0:
         return path
-    return _get_nth_parent_dir(os.path.dirname(path), parent - 1)
+    # Strip the last 'parent' components in one go; saturates at the root
+    # like repeated os.path.dirname calls would
+    return path.rsplit(os.sep, parent)[0] or os.sep
+
+def _get_nic_usb_path(interface):
+    """
+    Return the USB-path of the device network interface 'interface' belongs to,
+    or None if the interface has no device or no longer exists.
+
+    The result is cached for as long as the sysfs entry of the interface stays
+    the same. A re-created interface gets a new entry (with a new inode) even
+    if it keeps its name.
+    """
+    nic_link = os.path.join(_NIC_FILESYSTEM_LOCATION, interface)
+    try:
+        inode = os.lstat(nic_link).st_ino
+    except OSError:
+        return None
+
+    cached = _USB_PATH_CACHE.get(interface)
+    if cached and cached[0] == inode:
+        return cached[1]
+
+    # Virtual interfaces, such as lo and bridges, have no backing device and
+    # cannot be on a USB-path, so they are not resolved at all
+    if os.path.exists(os.path.join(nic_link, "device")):
+        nic_path = os.path.realpath(nic_link)
+        nic_usb_path = os.path.basename(_get_nth_parent_dir(nic_path, 3))
+    else:
+        nic_usb_path = None
+    _USB_PATH_CACHE[interface] = (inode, nic_usb_path)
+    return nic_usb_path
 
 def find_nic_with_usb_path(usb_path):
     """
     Search and return the name of a network interface attached to 'usb_path' USB-path
     """
-    _NIC_FILESYSTEM_LOCATION = "/sys/class/net"
-    interfaces = netifaces.interfaces()
-    for interface in interfaces:
-        nic_path = os.path.realpath(os.path.join(_NIC_FILESYSTEM_LOCATION, interface))
-        nic_usb_path = _get_nth_parent_dir(nic_path, 3)
+    # The entries of the sysfs directory are the interfaces themselves
+    interfaces = os.listdir(_NIC_FILESYSTEM_LOCATION)
+
+    # Forget interfaces that have disappeared
+    for interface in set(_USB_PATH_CACHE) - set(interfaces):
+        del _USB_PATH_CACHE[interface]
 
-        if os.path.basename(nic_usb_path) == usb_path:
+    for interface in interfaces:
+        if _get_nic_usb_path(interface) == usb_path:
             return interface
     return None
 
-def wait_and_enable_nic(usb_path, ip_address):
+def _open_link_monitor():
+    """
+    Open a netlink socket that becomes readable whenever a network interface
+    is added, removed or changed. sysfs does not generate inotify events, so
+    this is the way to be notified of new interfaces.
+
+    Returns:
+        The socket, or None if netlink is not available
+    """
+    try:
+        monitor = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                _NETLINK_ROUTE)
+        monitor.bind((0, _RTMGRP_LINK))
+    except (AttributeError, socket.error):
+        return None
+    return monitor
+
+def _wait_for_link_event(monitor):
+    """
+    Wait until 'monitor' reports a network interface change, or fall back to
+    sleeping the polling interval if there is no monitor. The rescan interval
+    bounds the wait in case a notification is lost.
+    """
+    if not monitor:
+        time.sleep(_POLLING_INTERVAL)
+        return
+
+    try:
+        readable = select.select([monitor], [], [], _RESCAN_INTERVAL)[0]
+        # Drain all queued notifications, a single rescan covers them all
+        while readable:
+            monitor.recv(65536)
+            readable = select.select([monitor], [], [], 0)[0]
+    except (select.error, socket.error) as err:
+        # ENOBUFS means that notifications were lost as the receive buffer
+        # overflowed, and EINTR that a signal interrupted the wait. Both are
+        # handled by rescanning right away.
+        if err.args[0] not in (errno.ENOBUFS, errno.EINTR):
+            raise
+
+def wait_and_enable_nic(usb_path, ip_address, monitor=None):
     """
     Wait until a network interface appears in USB-path 'usb_path' and once it does,
     assign ip address and subnet size <*.*.*.*/x> 'ip_address' to it.
-    """
-    while True:
-        nic = find_nic_with_usb_path(usb_path)
-        if not nic:
-            time.sleep(1)
-            continue
 
-        # assumes the script is present in the same directory
-        interface_script = os.path.join(os.path.dirname(__file__), "interface_script.sh")
+    'monitor' is a socket from _open_link_monitor to wait on. If it is not
+    given, a monitor is opened for the duration of the wait.
+    """
+    # Open the monitor before scanning, so that an interface appearing during
+    # the scan is not missed
+    own_monitor = monitor is None
+    if own_monitor:
+        monitor = _open_link_monitor()
+    try:
+        while True:
+            nic = find_nic_with_usb_path(usb_path)
+            if not nic:
+                _wait_for_link_event(monitor)
+                continue
 
-        subprocess32.check_call(["sudo", interface_script, nic, ip_address])
-        return
+            subprocess32.check_call(["sudo", _INTERFACE_SCRIPT, nic, ip_address])
+            return
+    finally:
+        if own_monitor and monitor:
+            monitor.close()
 
 def main():
     """
@@ -73,11 +174,12 @@ def main():
                         "to the NIC <*.*.*.*/x>")
     args = parser.parse_args()
 
+    monitor = _open_link_monitor()
     while True:
         nic = find_nic_with_usb_path(args.path)
         if not nic:
-            wait_and_enable_nic(args.path, args.ip)
-        time.sleep(1)
+            wait_and_enable_nic(args.path, args.ip, monitor)
+        _wait_for_link_event(monitor)
 
 if __name__ == '__main__':
     main()
@@ -23,12 +23,15 @@ import time
 import aft.tools.ansiparser as ansiparser
 from aft.tools.thread_handler import Thread_handler as thread_handler
 
-def main(port, rate, output):
+def main(port, rate, output, xonxoff=False):
     """
     Initialization.
+
+    Software flow control is only needed by some legacy adapters. Otherwise
+    it just makes the driver scan every byte for XON/XOFF characters.
     """
 
-    serial_stream = serial.Serial(port, rate, timeout=0.01, xonxoff=True)
+    serial_stream = serial.Serial(port, rate, timeout=0.1, xonxoff=xonxoff)
     output_file = open(output, "w")
 
     print("Starting recording from " + str(port) + " to " + str(output) + ".")
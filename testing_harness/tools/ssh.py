@@ -19,11 +19,26 @@ Tools for remote controlling a device over ssh.
 from aft.logger import Logger as logger
 import aft.tools.misc as tools
 import os
+import atexit
+import socket
+import tempfile
 try:
     import subprocess32
 except ImportError:
     import subprocess as subprocess32
 
+_SSH_KEY = "".join([os.path.expanduser("~"), "/.ssh/id_rsa_testing_harness"])
+
+# Time in seconds an idle master connection is kept open
+_CONTROL_PERSIST = 600
+
+_SSH_PORT = 22
+# Timeout in seconds for the TCP check preceding a connectivity test
+_PORT_CHECK_TIMEOUT = 2
+
+# (remote_ip, user) -> control socket path of the open master connections
+_MASTER_CONNECTIONS = {}
+
 def _get_proxy_settings():
     """
     Fetches proxy settings from the environment.
@@ -36,25 +51,150 @@ def _get_proxy_settings():
             proxy_env_command += "export " + var + '="' + val + '"; '
     return proxy_env_command
 
+def _get_control_path(remote_ip, user):
+    """
+    Return the control socket path of the master connection to remote_ip
+    """
+    return os.path.join(tempfile.gettempdir(),
+                        "aft_ssh_" + user + "@" + str(remote_ip) + ".sock")
+
+def _get_ssh_args(connect_timeout):
+    """
+    Return the ssh command and the options common to every connection
+    """
+    return ["ssh",
+            "-i", _SSH_KEY,
+            "-o", "UserKnownHostsFile=/dev/null",
+            "-o", "StrictHostKeyChecking=no",
+            "-o", "BatchMode=yes",
+            "-o", "LogLevel=ERROR",
+            "-o", "ConnectTimeout=" + str(connect_timeout)]
+
+def _get_master_args(remote_ip, user):
+    """
+    Return the options for multiplexing over the master connection to
+    remote_ip, or an empty list if there is none. The options are understood
+    by both ssh and scp.
+    """
+    control_path = _MASTER_CONNECTIONS.get((str(remote_ip), user))
+    if not control_path:
+        return []
+    return ["-o", "ControlPath=" + control_path, "-o", "ControlMaster=no"]
+
+def open_master_connection(remote_ip, user = "root", connect_timeout = 15):
+    """
+    Open a persistent ssh connection to remote_ip. Subsequent remote_execute,
+    push and pull calls to the same remote_ip and user are multiplexed over it
+    instead of doing a new TCP connection and ssh handshake each.
+
+    The connection must be closed with close_master_connection when the
+    remote device is rebooted. Should the device disappear anyway, the
+    master exits on its own after the server alive checks fail.
+
+    Args:
+        remote_ip (str): Remote device IP
+        user (str): User that will be used with ssh
+        connect_timeout (integer): Timeout for establishing the connection
+
+    Returns:
+        True if the connection was opened, False otherwise. On failure
+        remote_execute keeps using separate connections.
+    """
+    close_master_connection(remote_ip, user)
+
+    control_path = _get_control_path(remote_ip, user)
+    ssh_args = _get_ssh_args(connect_timeout) + [
+        "-M",
+        "-S", control_path,
+        "-o", "ControlPersist=" + str(_CONTROL_PERSIST),
+        "-o", "ServerAliveInterval=5",
+        "-o", "ServerAliveCountMax=3",
+        "-N",
+        "-f",
+        user + "@" + str(remote_ip)]
+
+    # -f backgrounds the master once it has authenticated. Its output must
+    # not be piped, as the pipe would stay open for as long as the master.
+    try:
+        tools.local_execute(ssh_args, connect_timeout + 5,
+                            discard_output=True)
+    except (subprocess32.CalledProcessError,
+            subprocess32.TimeoutExpired) as err:
+        logger.warning("Could not open ssh master connection to %s: %s",
+                       remote_ip, err)
+        return False
+
+    _MASTER_CONNECTIONS[(str(remote_ip), user)] = control_path
+    return True
+
+def close_master_connection(remote_ip, user = "root"):
+    """
+    Close the master connection to remote_ip, if there is one. A master left
+    behind by an earlier run on the same control socket is closed too.
+
+    Args:
+        remote_ip (str): Remote device IP
+        user (str): User that was used with ssh
+    """
+    _MASTER_CONNECTIONS.pop((str(remote_ip), user), None)
+
+    control_path = _get_control_path(remote_ip, user)
+    if not os.path.exists(control_path):
+        return
+
+    try:
+        tools.local_execute(["ssh", "-S", control_path, "-O", "exit",
+                             user + "@" + str(remote_ip)],
+                            timeout = 10, discard_output=True)
+    except (subprocess32.CalledProcessError,
+            subprocess32.TimeoutExpired):
+        pass
+
+def _close_all_master_connections():
+    """
+    Close all open master connections, intended to be used as 'atexit' handle.
+    """
+    for remote_ip, user in list(_MASTER_CONNECTIONS):
+        close_master_connection(remote_ip, user)
+
+atexit.register(_close_all_master_connections)
+
 def test_ssh_connectivity(remote_ip, timeout = 10):
     """
     Test whether remote_ip is accessible over ssh.
+
+    The ssh port is first checked with a plain TCP connection, so that a
+    device that is still booting is detected quickly and without a full ssh
+    handshake.
     """
+    try:
+        socket.create_connection((remote_ip, _SSH_PORT),
+                                 timeout = _PORT_CHECK_TIMEOUT).close()
+    except socket.error as err:
+        # Expected while the device is still booting
+        logger.debug("Could not connect to the ssh port of %s: %s",
+                     remote_ip, err)
+        return False
+
     try:
         remote_execute(remote_ip, ["echo", "$?"], connect_timeout = timeout)
         return True
     except subprocess32.CalledProcessError as err:
-        logger.warning("Could not establish ssh-connection to " + remote_ip +
-                        ". SSH return code: " + str(err.returncode) + ".")
+        logger.warning("Could not establish ssh-connection to %s. "
+                       "SSH return code: %s.", remote_ip, err.returncode)
         return False
 
 def push(remote_ip, source, destination, timeout = 60,
          ignore_return_codes = None, user = "root"):
     """
     Transmit a file from local 'source' to remote 'destination' over SCP
+
+    If a master connection to remote_ip has been opened with
+    open_master_connection, the file is transmitted over it.
     """
-    scp_args = ["scp", source,
-                user + "@" + str(remote_ip) + ":" + destination]
+    scp_args = ["scp"] + _get_master_args(remote_ip, user) + [
+        source,
+        user + "@" + str(remote_ip) + ":" + destination]
     return tools.local_execute(scp_args, timeout, ignore_return_codes)
 
 def pull(remote_ip, source, destination,timeout = 60,
@@ -62,6 +202,9 @@ def pull(remote_ip, source, destination,timeout = 60,
     """
     Transmit a file from remote 'source' to local 'destination' over SCP
 
+    If a master connection to remote_ip has been opened with
+    open_master_connection, the file is transmitted over it.
+
     Args:
         remote_ip (str): Remote device IP
         source (str): path to file on the remote filesystem
@@ -85,7 +228,7 @@ def pull(remote_ip, source, destination,timeout = 60,
         "-o",
         "UserKnownHostsFile=/dev/null",
         "-o",
-        "StrictHostKeyChecking=no",
+        "StrictHostKeyChecking=no"] + _get_master_args(remote_ip, user) + [
         user + "@" + str(remote_ip) + ":" + source,
         destination]
     return tools.local_execute(scp_args, timeout, ignore_return_codes)
@@ -96,25 +239,23 @@ def remote_execute(remote_ip, command, timeout = 60, ignore_return_codes = None,
     Execute a Bash command over ssh on a remote device with IP 'remote_ip'.
     Returns combines stdout and stderr if there are no errors. On error raises
     subprocess32 errors.
+
+    If a master connection to remote_ip has been opened with
+    open_master_connection, the command is run over it.
     """
-    ssh_args = ["ssh",
-                "-i", "".join([os.path.expanduser("~"), "/.ssh/id_rsa_testing_harness"]),
-                "-o", "UserKnownHostsFile=/dev/null",
-                "-o", "StrictHostKeyChecking=no",
-                "-o", "BatchMode=yes",
-                "-o", "LogLevel=ERROR",
-                "-o", "ConnectTimeout=" + str(connect_timeout),
-                user + "@" + str(remote_ip),
-                _get_proxy_settings(),]
+    ssh_args = _get_ssh_args(connect_timeout) + \
+        _get_master_args(remote_ip, user) + \
+        [user + "@" + str(remote_ip), _get_proxy_settings()]
 
     logger.info("Executing " + " ".join(command), filename="ssh.log")
 
     ret = ""
     try:
-        ret = tools.local_execute(ssh_args + command, timeout, ignore_return_codes)
+        ret = tools.local_execute(ssh_args + command, timeout,
+                                  ignore_return_codes)
     except subprocess32.CalledProcessError as err:
-        logger.error("Command raised exception: " + str(err), filename="ssh.log")
-        logger.error("Output: " + str(err.output), filename="ssh.log")
+        logger.error("Command raised exception: %s", err, filename="ssh.log")
+        logger.error("Output: %s", err.output, filename="ssh.log")
         raise err
 
     return ret